@@ -4,63 +4,328 @@ Google Ping Monitor
 Google(8.8.8.8)への継続的なpingモニタリングと統計報告
 """
 
+import argparse
+import asyncio
+import gc
+import math
 import subprocess
 import time
-import json
-import requests
+import orjson
+from urllib.parse import urlsplit
 import platform
 import socket
+import struct
 import re
-from datetime import datetime, timedelta
-from statistics import mean
-from threading import Thread, Event
+from datetime import datetime, date
+from collections import deque
+from dataclasses import dataclass, asdict
+import threading
 import signal
 import sys
 import os
 
+import numpy as np
+
+# ICMP Echo (RFC 792)
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP_HEADER = struct.Struct("!BBHHH")  # type, code, checksum, id, seq
+ICMP_PAYLOAD = b"ping-check".ljust(32, b"\x00")
+PING_TIMEOUT = 3  # 秒
+
+# 応答時間のヒストグラム: 0〜512msを2ms幅の256区間 + 512ms以上のあふれ区間
+HIST_BUCKET_MS = 2
+HIST_BINS = 256 + 1
+
+LOG_FLUSH_TICKS = 10  # pingループの出力をまとめて書き出す周期（tick数）
+
+WEBHOOK_OUTBOX_SIZE = 1024  # 超えた場合は古いメッセージから捨てる
+WEBHOOK_MAX_RETRIES = 5  # レート制限(429)時の再送回数
+WEBHOOK_SHUTDOWN_TIMEOUT = 30  # 終了時に送信完了を待つ秒数
+
+# pingコマンド出力から応答時間を取り出す正規表現（出力はbytesのまま照合）
+# 日本語Windowsの出力はCP932なので、UTF-8と両方の「時間」に一致させる
+_WIN_RE = re.compile(
+    b"(?:" + re.escape("時間".encode("cp932")) + b"|" + re.escape("時間".encode("utf-8")) + b")"
+    rb"\s*[<>=]*(\d+)ms")
+_NIX_RE = re.compile(rb"time=(\d+(?:\.\d+)?)\s*ms")
+
+# netlink (linux/netlink.h, linux/rtnetlink.h)
+NLMSG_HEADER = struct.Struct("=IHHII")  # len, type, flags, seq, pid
+RTMSG = struct.Struct("=BBBBBBBBI")  # family, dst_len, src_len, tos, table, protocol, scope, type, flags
+RTATTR = struct.Struct("=HH")  # len, type
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PREFSRC = 7
+RTA_TABLE = 15
+RT_TABLE_MAIN = 254
+RTN_UNICAST = 1
+SIOCGIFADDR = 0x8915
+
+def nl_align(length):
+    """netlinkメッセージ・属性の4バイト境界"""
+    return (length + 3) & ~3
+
+def netlink_default_route():
+    """netlink(RTM_GETROUTE)でカーネルのmainテーブルからデフォルトルートを取得
+    
+    (ゲートウェイのIPアドレス, 出力インターフェース番号, 送信元アドレス) を返す。
+    見つからない要素はNone。
+    ダンプには全テーブルのルートが含まれるため、`ip route show default`と同じく
+    mainテーブルのユニキャストルートだけを対象にする。
+    """
+    fallback = (None, None, None)
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as s:
+        s.settimeout(5)
+        request = (NLMSG_HEADER.pack(NLMSG_HEADER.size + RTMSG.size, RTM_GETROUTE,
+                                     NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+                   + RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0))
+        s.sendto(request, (0, 0))
+        
+        while True:
+            data = s.recv(65536)
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                msg_len, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+                if msg_len < NLMSG_HEADER.size or msg_type == NLMSG_DONE:
+                    return fallback
+                if msg_type == NLMSG_ERROR:
+                    errno = -struct.unpack_from("=i", data, offset + NLMSG_HEADER.size)[0]
+                    raise OSError(errno, os.strerror(errno))
+                
+                if msg_type == RTM_NEWROUTE:
+                    rtm_offset = offset + NLMSG_HEADER.size
+                    _, dst_len, _, _, table, _, _, rtm_type, _ = RTMSG.unpack_from(data, rtm_offset)
+                    if dst_len == 0 and rtm_type == RTN_UNICAST:
+                        # デフォルトルートの属性からRTA_GATEWAY・RTA_OIF・RTA_PREFSRCを探す
+                        gateway = oif = prefsrc = None
+                        attr_offset = rtm_offset + RTMSG.size
+                        msg_end = offset + msg_len
+                        while attr_offset + RTATTR.size <= msg_end:
+                            rta_len, rta_type = RTATTR.unpack_from(data, attr_offset)
+                            if rta_len < RTATTR.size:
+                                break
+                            value_offset = attr_offset + RTATTR.size
+                            if rta_type == RTA_GATEWAY:
+                                gateway = socket.inet_ntoa(data[value_offset:value_offset + 4])
+                            elif rta_type == RTA_OIF:
+                                oif = struct.unpack_from("=I", data, value_offset)[0]
+                            elif rta_type == RTA_PREFSRC:
+                                prefsrc = socket.inet_ntoa(data[value_offset:value_offset + 4])
+                            elif rta_type == RTA_TABLE:
+                                # rtm_tableは8ビットなので、あればこちらの番号を使う
+                                table = struct.unpack_from("=I", data, value_offset)[0]
+                            attr_offset += nl_align(rta_len)
+                        if table == RT_TABLE_MAIN:
+                            if gateway:
+                                return gateway, oif, prefsrc
+                            if fallback[1] is None:
+                                fallback = (None, oif, prefsrc)
+                
+                offset += nl_align(msg_len)
+
+def interface_ipv4(ifname):
+    """ioctl(SIOCGIFADDR)でインターフェースのIPv4アドレスを取得（Linux用）"""
+    import fcntl  # Windowsには存在しない
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        ifreq = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', ifname[:15].encode()))
+    # struct ifreq: ifr_name[16] + sockaddr_in(family[2], port[2], addr[4], ...)
+    return socket.inet_ntoa(ifreq[20:24])
+
+def ones_complement_sum(data):
+    """RFC 1071 の16ビット1の補数和（反転前のチェックサム）を計算"""
+    if len(data) % 2:
+        # bytearrayに+=すると呼び出し元のバッファが伸びるので新しいbytesを作る
+        data = bytes(data) + b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    # 桁上がりがなくなるまで畳み込み、常に0xffff以下を返す
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return total
+
+class ResponseTimeHistogram:
+    """応答時間(ms)のヒストグラムと集計値（サンプル自体は保持しない）"""
+    
+    def __init__(self):
+        self.hist = np.zeros(HIST_BINS, dtype=np.uint32)
+        self.reset()
+    
+    def reset(self):
+        """集計をリセット"""
+        self.hist[:] = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = math.inf
+        self.max = 0.0
+    
+    def add(self, response_time):
+        """応答時間を加える"""
+        self.hist[min(int(response_time / HIST_BUCKET_MS), HIST_BINS - 1)] += 1
+        self.count += 1
+        self.sum += response_time
+        self.sumsq += response_time * response_time
+        if response_time < self.min:
+            self.min = response_time
+        if response_time > self.max:
+            self.max = response_time
+    
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+    
+    def std(self):
+        if not self.count:
+            return 0.0
+        mean = self.mean()
+        return math.sqrt(max(self.sumsq / self.count - mean * mean, 0.0))
+    
+    def percentile(self, q):
+        """q(0〜1)分位の応答時間を求める（区間の上端、最大値で頭打ち）"""
+        if not self.count:
+            return 0.0
+        cdf = np.cumsum(self.hist)
+        bucket = int(np.searchsorted(cdf, q * self.count))
+        if bucket >= HIST_BINS - 1:
+            # あふれ区間には上端がないので最大値を上限とする
+            return float(self.max)
+        return float(min((bucket + 1) * HIST_BUCKET_MS, self.max))
+
+@dataclass
+class DailyStats:
+    """1日分のping統計"""
+    count: int  # 成功回数
+    fails: int  # 失敗回数
+    total: int  # 総ping回数
+    success_rate: float  # 成功率(%)
+    avg_time: float
+    max_time: float
+    min_time: float
+    std_time: float  # 標準偏差
+    p50_time: float  # 中央値（ヒストグラムの区間上端）
+    p99_time: float  # 99パーセンタイル（同上）
+    gw_count: int  # ゲートウェイの成功回数
+    gw_fails: int  # ゲートウェイの失敗回数
+    gw_avg_time: float
+    gw_max_time: float
+    gw_p99_time: float
+
 class PingMonitor:
-    def __init__(self, config_file="config.json"):
+    # Discord Embedのひな形（値の文字列はformat_mapで埋める）
+    _EMBED_TEMPLATE = {
+        "title": "🌐 Ping Monitor 日次レポート",
+        "description": "**日付**: {report_date}\n**対象**: Google (8.8.8.8)\n**送信元**: {local_ip}",
+        "fields": [
+            {
+                "name": "📊 応答時間統計",
+                "value": ("**平均**: {avg_time:.1f}ms\n**最大**: {max_time:.1f}ms\n**最小**: {min_time:.1f}ms\n"
+                          "**中央値**: ≤{p50_time:.1f}ms\n**99%**: ≤{p99_time:.1f}ms\n**標準偏差**: {std_time:.1f}ms"),
+                "inline": True
+            },
+            {
+                "name": "📈 到達性統計",
+                "value": "**成功率**: {success_rate:.2f}%\n**成功回数**: {count}\n**失敗回数**: {fails}",
+                "inline": True
+            },
+            {
+                "name": "🏠 ゲートウェイ(LAN)応答時間",
+                "value": ("**平均**: {gw_avg_time:.1f}ms\n**最大**: {gw_max_time:.1f}ms\n"
+                          "**99%**: ≤{gw_p99_time:.1f}ms\n**失敗回数**: {gw_fails}"),
+                "inline": True
+            },
+            {
+                "name": "⏱️ 監視情報",
+                "value": "**総ping回数**: {total}\n**監視間隔**: {ping_interval}秒",
+                "inline": True
+            }
+        ],
+        "footer": {
+            "text": "Ping Monitor by Python"
+        }
+    }
+    
+    def __init__(self, config_file="config.json", realtime=False):
         self.target_ip = "8.8.8.8"
         self.ping_interval = 1  # 1秒間隔
-        self.ping_results = []
-        self.unreachable_times = []
+        self.realtime = realtime  # SCHED_RRで実行するか
+        # 当日の応答時間(ms)の集計（Google / デフォルトゲートウェイ）
+        self._google = ResponseTimeHistogram()
+        self._gateway = ResponseTimeHistogram()
+        self._gw_unreachable = 0
+        # 到達不能期間 [(開始, 終了)]（UNIX秒、連続した失敗は1件にまとめる）
+        self._outages = []
+        self._in_outage = False
+        self._n_unreachable = 0
         self.running = True
-        self.stop_event = Event()
+        self._ping_task = None  # ping_loopのTask（停止時にキャンセル）
+        self._log_buf = []  # pingループの出力（LOG_FLUSH_TICKSごとに書き出す）
+        self._is_windows = platform.system() == "Windows"
+        
+        # ICMPソケット（Windowsまたは開けない場合はpingコマンドを使用）
+        self._icmp_sock = None
+        self._icmp_raw = False
+        self._icmp_id = os.getpid() & 0xffff
+        self._icmp_seq = 0
+        # seq=0のEcho Requestを組み立てておき、送信時はseqとチェックサムだけ書き換える
+        self._icmp_packet = bytearray(ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, self._icmp_id, 0) + ICMP_PAYLOAD)
+        self._icmp_sum0 = ones_complement_sum(self._icmp_packet)
+        self._icmp_waiters = {}  # seq -> 応答受信時刻を受け取るFuture
+        if not self._is_windows:
+            self._icmp_sock = self.open_icmp_socket()
+        
+        # pingコマンド（フォールバック用）の引数と応答時間の正規表現
+        if self._is_windows:
+            self._ping_cmd_prefix = ['ping', '-n', '1', '-w', '3000']
+        else:
+            self._ping_cmd_prefix = ['ping', '-c', '1', '-W', '3']
+        self._ping_re = _WIN_RE if self._is_windows else _NIX_RE
         
         # 設定ファイルの読み込み
         self.load_config(config_file)
         
+        # Discord送信用の接続（送信スレッドで作成して使い回す）と送信スレッド
+        self._http = None
+        self._webhook_path = None
+        # pingループ→送信スレッドの単方向キュー（deque.append/popleftはGIL下でアトミック）
+        self._outbox = deque(maxlen=WEBHOOK_OUTBOX_SIZE)
+        self._outbox_event = threading.Event()
+        self._webhook_thread = threading.Thread(target=self.webhook_worker, daemon=True)
+        self._webhook_thread.start()
+        
         # デフォルトゲートウェイを取得
         self.default_gateway = self.get_default_gateway()
         print(f"デフォルトゲートウェイ: {self.default_gateway}")
+        self._ping_argv_google = self._ping_cmd_prefix + [self.target_ip]
+        self._ping_argv_gw = self._ping_cmd_prefix + [self.default_gateway]
         
         # 自分のIPアドレスを取得
         self.local_ip = self.get_local_ip()
         print(f"送信元IPアドレス: {self.local_ip}")
-        
-        # シグナルハンドラーの設定
-        signal.signal(signal.SIGINT, self.signal_handler)
-        signal.signal(signal.SIGTERM, self.signal_handler)
     
     def load_config(self, config_file):
         """設定ファイルを読み込む"""
         try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
+            with open(config_file, 'rb') as f:
+                config = orjson.loads(f.read())
                 self.webhook_url = config.get('discord_webhook_url')
                 if not self.webhook_url or self.webhook_url == "https://discord.com/api/webhooks/YOUR_WEBHOOK_ID/YOUR_WEBHOOK_TOKEN":
                     print("警告: Discord Webhook URLが設定されていません。config.jsonを編集してください。")
         except FileNotFoundError:
             print(f"設定ファイル {config_file} が見つかりません。")
             sys.exit(1)
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             print(f"設定ファイル {config_file} の形式が正しくありません。")
             sys.exit(1)
     
     def get_default_gateway(self):
         """デフォルトゲートウェイのIPアドレスを取得（Windows/Linux対応）"""
         try:
-            if platform.system() == "Windows":
+            if self._is_windows:
                 # Windows: route print コマンドを使用
                 result = subprocess.run(['route', 'print', '0.0.0.0'], 
                                       capture_output=True, text=True, timeout=10)
@@ -70,13 +335,26 @@ class PingMonitor:
                         if len(parts) >= 3:
                             return parts[2]
             else:
-                # Linux/Unix: ip route コマンドを使用
-                result = subprocess.run(['ip', 'route', 'show', 'default'], 
-                                      capture_output=True, text=True, timeout=10)
-                if result.returncode == 0:
-                    match = re.search(r'default via (\d+\.\d+\.\d+\.\d+)', result.stdout)
-                    if match:
-                        return match.group(1)
+                # Linux: netlinkでカーネルに直接問い合わせる
+                if hasattr(socket, 'AF_NETLINK'):
+                    try:
+                        gateway, _, _ = netlink_default_route()
+                        if gateway:
+                            return gateway
+                    except OSError as e:
+                        # サンドボックス等でnetlinkが使えない場合はコマンドで取得
+                        print(f"netlinkでのデフォルトゲートウェイ取得に失敗: {e}")
+                
+                # Unix: ip route コマンドを使用（無ければrouteコマンドへ）
+                try:
+                    result = subprocess.run(['ip', 'route', 'show', 'default'], 
+                                          capture_output=True, text=True, timeout=10)
+                    if result.returncode == 0:
+                        match = re.search(r'default via (\d+\.\d+\.\d+\.\d+)', result.stdout)
+                        if match:
+                            return match.group(1)
+                except (OSError, subprocess.SubprocessError):
+                    pass
                 
                 # 古いシステム用にrouteコマンドも試す
                 result = subprocess.run(['route', '-n'], 
@@ -93,6 +371,18 @@ class PingMonitor:
     
     def get_local_ip(self):
         """ローカルIPアドレスを取得"""
+        if hasattr(socket, 'AF_NETLINK'):
+            # Linux: デフォルトルートのインターフェースのアドレスを直接読む（パケットを送らない）
+            try:
+                _, oif, prefsrc = netlink_default_route()
+                # ルートに送信元アドレス(src)が指定されていればそれが実際の送信元
+                if prefsrc:
+                    return prefsrc
+                if oif:
+                    return interface_ipv4(socket.if_indextoname(oif))
+            except OSError:
+                pass
+        
         try:
             # Googleの公開DNSに接続を試行してローカルIPを取得
             with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
@@ -101,28 +391,128 @@ class PingMonitor:
         except Exception:
             return "不明"
     
-    def ping_host(self, host):
-        """指定したホストにpingを送信"""
+    def open_icmp_socket(self):
+        """ICMPソケットを開く（非特権のDGRAMを優先し、失敗したらRAW）"""
+        for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+            try:
+                sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            except OSError:
+                continue
+            sock.setblocking(False)
+            self._icmp_raw = sock_type == socket.SOCK_RAW
+            return sock
+        
+        print("ICMPソケットを開けないため、pingコマンドを使用します")
+        return None
+    
+    async def ping_host(self, host):
+        """指定したホストにICMP Echoを送信し、応答時間(ms)を返す"""
+        return (await self.ping_many([host]))[0]
+    
+    async def ping_many(self, hosts):
+        """複数ホストにICMP Echoを続けて送信し、1つのタイムアウトで全応答を待つ
+        
+        hostsと同じ順で応答時間(ms)のリストを返す（到達不能はNone）。
+        """
+        if self._icmp_sock is None:
+            return await asyncio.gather(*(self.ping_host_command(host) for host in hosts))
+        
+        loop = asyncio.get_running_loop()
+        probes = []  # (seq, waiter, 送信時刻)
         try:
-            if platform.system() == "Windows":
-                cmd = ['ping', '-n', '1', '-w', '3000', host]
+            for host in hosts:
+                self._icmp_seq = (self._icmp_seq + 1) & 0xffff
+                seq = self._icmp_seq
+                packet = self.build_echo_request(seq)
+                
+                waiter = loop.create_future()
+                self._icmp_waiters[seq] = waiter
+                start_time = time.perf_counter()
+                try:
+                    self._icmp_sock.sendto(packet, (host, 0))
+                except OSError as e:
+                    self.log(f"Ping実行エラー: {e}")
+                    waiter.cancel()
+                probes.append((seq, waiter, start_time))
+            
+            waiters = [waiter for _, waiter, _ in probes if not waiter.cancelled()]
+            if waiters:
+                await asyncio.wait(waiters, timeout=PING_TIMEOUT)
+            
+            return [(waiter.result() - start_time) * 1000
+                    if waiter.done() and not waiter.cancelled() else None
+                    for _, waiter, start_time in probes]
+        finally:
+            for seq, waiter, _ in probes:
+                self._icmp_waiters.pop(seq, None)
+                waiter.cancel()
+    
+    def build_echo_request(self, seq):
+        """シーケンス番号を書き込んだEcho Requestを返す（チェックサムは差分で更新）
+        
+        返すバッファは使い回すので、次の呼び出しまでに送信すること。
+        """
+        total = self._icmp_sum0 + seq
+        total = (total & 0xffff) + (total >> 16)
+        struct.pack_into("!H", self._icmp_packet, 6, seq)
+        struct.pack_into("!H", self._icmp_packet, 2, ~total & 0xffff)
+        return self._icmp_packet
+    
+    def on_icmp_readable(self):
+        """受信したEcho Replyを待機中のpingに振り分ける"""
+        while True:
+            try:
+                data = self._icmp_sock.recv(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # ICMPエラー（到達不能など）はタイムアウトとして扱う
+                return
+            end_time = time.perf_counter()
+            
+            # RAWソケットではIPヘッダが付いてくる
+            if self._icmp_raw:
+                data = data[(data[0] & 0x0f) * 4:]
+            if len(data) < ICMP_HEADER.size:
+                continue
+            
+            icmp_type, _, _, reply_id, reply_seq = ICMP_HEADER.unpack_from(data)
+            # DGRAMソケットではカーネルがIDを書き換えるためシーケンス番号で照合
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            if self._icmp_raw and reply_id != self._icmp_id:
+                continue
+            
+            waiter = self._icmp_waiters.get(reply_seq)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(end_time)
+    
+    async def ping_host_command(self, host):
+        """pingコマンドでpingを送信（Windows用フォールバック）"""
+        try:
+            if host is self.target_ip:
+                cmd = self._ping_argv_google
+            elif host is self.default_gateway:
+                cmd = self._ping_argv_gw
             else:
-                cmd = ['ping', '-c', '1', '-W', '3', host]
+                cmd = self._ping_cmd_prefix + [host]
             
             start_time = time.time()
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+            try:
+                stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=5)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                return None
             end_time = time.time()
             
-            if result.returncode == 0:
+            if proc.returncode == 0:
                 # 応答時間をパース
-                if platform.system() == "Windows":
-                    match = re.search(r'時間[<>=]*(\d+)ms', result.stdout)
-                    if match:
-                        return float(match.group(1))
-                else:
-                    match = re.search(r'time=(\d+\.?\d*).*ms', result.stdout)
-                    if match:
-                        return float(match.group(1))
+                match = self._ping_re.search(stdout)
+                if match:
+                    return float(match.group(1))
                 
                 # パースに失敗した場合は測定時間を使用
                 return (end_time - start_time) * 1000
@@ -130,106 +520,138 @@ class PingMonitor:
                 return None
                 
         except Exception as e:
-            print(f"Ping実行エラー: {e}")
+            self.log(f"Ping実行エラー: {e}")
             return None
     
-    def ping_loop(self):
+    async def ping_loop(self):
         """メインのpingループ"""
         print(f"Google({self.target_ip})へのpingモニタリングを開始します...")
         print("Ctrl+Cで停止できます")
         
-        last_day = datetime.now().date()
+        loop = asyncio.get_running_loop()
+        # 日付はローカル時刻での1970-01-01からの日数（整数）で比較する
+        last_day_time = time.time()
+        last_day = int((last_day_time + time.localtime(last_day_time).tm_gmtoff) // 86400)
+        start = loop.time()
+        tick = 0
+        ticks_since_flush = 0
         
-        while self.running and not self.stop_event.is_set():
-            current_time = datetime.now()
-            current_date = current_time.date()
+        while self.running:
+            current_time = time.time()
+            local_time = time.localtime(current_time)
+            current_day = int((current_time + local_time.tm_gmtoff) // 86400)
+            hhmmss = time.strftime('%H:%M:%S', local_time)
             
             # 日付が変わったら前日の統計を送信
-            if current_date != last_day and self.ping_results:
-                self.send_daily_report(last_day)
+            if current_day != last_day and self._google.count:
+                self.flush_log()
+                self.send_daily_report(date.fromtimestamp(last_day_time))
                 self.reset_daily_data()
-                last_day = current_date
+                # ループ中はGCを止めているので日次でまとめて回収
+                gc.collect()
+                last_day = current_day
+                last_day_time = current_time
             
-            # Googleにping
-            response_time = self.ping_host(self.target_ip)
+            # Googleとデフォルトゲートウェイに同時にping（1回の待ち合わせで両方の応答を待つ）
+            if self.default_gateway:
+                response_time, gw_response = await self.ping_many([self.target_ip, self.default_gateway])
+                if gw_response is not None:
+                    self._gateway.add(gw_response)
+                else:
+                    self._gw_unreachable += 1
+            else:
+                response_time, gw_response = await self.ping_host(self.target_ip), None
             
             if response_time is not None:
-                self.ping_results.append(response_time)
-                print(f"{current_time.strftime('%H:%M:%S')} - Google ping: {response_time:.1f}ms")
+                self._google.add(response_time)
+                self._in_outage = False
+                self.log(f"{hhmmss} - Google ping: {response_time:.1f}ms")
             else:
                 # Googleに到達不能
-                self.unreachable_times.append(current_time)
-                print(f"{current_time.strftime('%H:%M:%S')} - Google到達不能")
+                failed_at = int(current_time)
+                if self._in_outage:
+                    self._outages[-1] = (self._outages[-1][0], failed_at)
+                else:
+                    self._outages.append((failed_at, failed_at))
+                    self._in_outage = True
+                self._n_unreachable += 1
+                self.log(f"{hhmmss} - Google到達不能")
                 
-                # デフォルトゲートウェイにping
+                # デフォルトゲートウェイの結果
                 if self.default_gateway:
-                    gw_response = self.ping_host(self.default_gateway)
                     if gw_response is not None:
-                        print(f"  -> デフォルトゲートウェイ({self.default_gateway}): {gw_response:.1f}ms")
+                        self.log(f"  -> デフォルトゲートウェイ({self.default_gateway}): {gw_response:.1f}ms")
                     else:
-                        print(f"  -> デフォルトゲートウェイ({self.default_gateway}): 到達不能")
+                        self.log(f"  -> デフォルトゲートウェイ({self.default_gateway}): 到達不能")
             
-            # 1秒待機
-            if not self.stop_event.wait(self.ping_interval):
-                continue
-            else:
-                break
+            ticks_since_flush += 1
+            if ticks_since_flush >= LOG_FLUSH_TICKS:
+                self.flush_log()
+                ticks_since_flush = 0
+            
+            # 次の周期まで待機（開始時刻からの絶対時刻で締め切りを決め、ドリフトを防ぐ）
+            now = loop.time()
+            # タイムアウト等で過ぎた周期は飛ばす
+            tick = max(tick + 1, math.ceil((now - start) / self.ping_interval))
+            await asyncio.sleep(start + tick * self.ping_interval - now)
+    
+    def log(self, message):
+        """pingループの出力をバッファに溜める（書き込みのシステムコールをまとめるため）"""
+        self._log_buf.append(message)
+    
+    def flush_log(self):
+        """溜めた出力を標準出力に書き出す"""
+        if self._log_buf:
+            sys.stdout.write("\n".join(self._log_buf) + "\n")
+            sys.stdout.flush()
+            self._log_buf.clear()
     
     def reset_daily_data(self):
         """日次データをリセット"""
-        self.ping_results = []
-        self.unreachable_times = []
+        self._google.reset()
+        self._gateway.reset()
+        self._gw_unreachable = 0
+        self._outages = []
+        self._in_outage = False
+        self._n_unreachable = 0
+    
+    def summarize(self):
+        """当日の統計をまとめて計算"""
+        google, gateway = self._google, self._gateway
+        total_pings = google.count + self._n_unreachable
+        success_rate = (google.count / total_pings * 100) if total_pings > 0 else 0
+        
+        return DailyStats(count=google.count, fails=self._n_unreachable, total=total_pings,
+                          success_rate=success_rate, avg_time=google.mean(),
+                          max_time=google.max, min_time=google.min if google.count else 0.0,
+                          std_time=google.std(), p50_time=google.percentile(0.5),
+                          p99_time=google.percentile(0.99),
+                          gw_count=gateway.count, gw_fails=self._gw_unreachable,
+                          gw_avg_time=gateway.mean(), gw_max_time=gateway.max,
+                          gw_p99_time=gateway.percentile(0.99))
     
     def send_daily_report(self, report_date):
         """日次レポートをDiscordに送信"""
+        stats = self.summarize()
         if not self.webhook_url or "YOUR_WEBHOOK" in self.webhook_url:
             print("Discord Webhook URLが設定されていないため、レポートをコンソールに出力します：")
-            self.print_daily_report(report_date)
+            self.print_daily_report(report_date, stats)
             return
         
         try:
-            # 統計を計算
-            total_pings = len(self.ping_results) + len(self.unreachable_times)
-            success_rate = (len(self.ping_results) / total_pings * 100) if total_pings > 0 else 0
-            
-            if self.ping_results:
-                avg_time = mean(self.ping_results)
-                max_time = max(self.ping_results)
-                min_time = min(self.ping_results)
-            else:
-                avg_time = max_time = min_time = 0
-            
-            unreachable_count = len(self.unreachable_times)
+            # Discord Embedメッセージをひな形から作成（値の文字列だけ埋める）
+            values = asdict(stats)
+            values.update(report_date=report_date, local_ip=self.local_ip, ping_interval=self.ping_interval)
+            template = self._EMBED_TEMPLATE
+            embed = dict(
+                template,
+                description=template["description"].format_map(values),
+                color=0x00ff00 if stats.success_rate >= 99 else 0xff9900 if stats.success_rate >= 95 else 0xff0000,
+                fields=[dict(field, value=field["value"].format_map(values)) for field in template["fields"]],
+                timestamp=datetime.now().isoformat(),
+            )
             
-            # Discord Embedメッセージを作成
-            embed = {
-                "title": f"🌐 Ping Monitor 日次レポート",
-                "description": f"**日付**: {report_date}\n**対象**: Google (8.8.8.8)\n**送信元**: {self.local_ip}",
-                "color": 0x00ff00 if success_rate >= 99 else 0xff9900 if success_rate >= 95 else 0xff0000,
-                "fields": [
-                    {
-                        "name": "📊 応答時間統計",
-                        "value": f"**平均**: {avg_time:.1f}ms\n**最大**: {max_time:.1f}ms\n**最小**: {min_time:.1f}ms",
-                        "inline": True
-                    },
-                    {
-                        "name": "📈 到達性統計",
-                        "value": f"**成功率**: {success_rate:.2f}%\n**成功回数**: {len(self.ping_results)}\n**失敗回数**: {unreachable_count}",
-                        "inline": True
-                    },
-                    {
-                        "name": "⏱️ 監視情報",
-                        "value": f"**総ping回数**: {total_pings}\n**監視間隔**: {self.ping_interval}秒",
-                        "inline": True
-                    }
-                ],
-                "timestamp": datetime.now().isoformat(),
-                "footer": {
-                    "text": "Ping Monitor by Python"
-                }
-            }
-            
-            if unreachable_count > 0:
+            if stats.fails > 0:
                 # 到達不能時間を追加
                 unreachable_periods = self.format_unreachable_periods()
                 embed["fields"].append({
@@ -242,92 +664,240 @@ class PingMonitor:
                 "embeds": [embed]
             }
             
-            response = requests.post(self.webhook_url, json=payload, timeout=10)
-            if response.status_code == 204:
+            # 送信はスレッドに任せ、pingループをブロックしない
+            self._outbox.append((report_date, payload))
+            self._outbox_event.set()
+                
+        except Exception as e:
+            print(f"レポート送信エラー: {e}")
+            self.print_daily_report(report_date, stats)
+    
+    def webhook_worker(self):
+        """キューに積まれたWebhookメッセージを順に送信するスレッド"""
+        while True:
+            try:
+                item = self._outbox.popleft()
+            except IndexError:
+                # 空なら起こされるまで待つ（clear後にもう一度popleftで確認する）
+                self._outbox_event.wait()
+                self._outbox_event.clear()
+                continue
+            if item is None:
+                break
+            self.post_webhook(*item)
+    
+    def post_webhook(self, report_date, payload):
+        """Discord Webhookに送信（レート制限時はRetry-Afterだけ待って再送）"""
+        try:
+            body = orjson.dumps(payload)
+            for _ in range(WEBHOOK_MAX_RETRIES):
+                response = self.webhook_request(body)
+                if response.status != 429:
+                    break
+                retry_after = float(response.getheader("Retry-After", 1))
+                print(f"Discordのレート制限のため{retry_after}秒後に再送します")
+                time.sleep(retry_after)
+            
+            if response.status == 204:
                 print(f"✅ {report_date}の日次レポートをDiscordに送信しました")
             else:
-                print(f"❌ Discord送信エラー: {response.status_code}")
-                self.print_daily_report(report_date)
+                print(f"❌ Discord送信エラー: {response.status}")
+                self.print_embeds(payload)
                 
         except Exception as e:
             print(f"レポート送信エラー: {e}")
-            self.print_daily_report(report_date)
+            self.print_embeds(payload)
+    
+    def connect_webhook(self):
+        """Webhook URLのホストへの接続を作成"""
+        # http.client(email.*など約20モジュール)はWebhook送信時まで読み込まない
+        import http.client
+        
+        url = urlsplit(self.webhook_url)
+        self._webhook_path = url.path + (f"?{url.query}" if url.query else "")
+        if url.scheme == "https":
+            return http.client.HTTPSConnection(url.netloc, timeout=10)
+        return http.client.HTTPConnection(url.netloc, timeout=10)
+    
+    def webhook_request(self, body):
+        """WebhookにJSONをPOSTしてレスポンスを返す（切断済みの接続は1回だけ張り直す）"""
+        import http.client
+        
+        for attempt in range(2):
+            if self._http is None:
+                self._http = self.connect_webhook()
+            try:
+                self._http.request("POST", self._webhook_path, body,
+                                   {"Content-Type": "application/json"})
+                response = self._http.getresponse()
+                response.read()
+                return response
+            except (http.client.BadStatusLine, ConnectionError):
+                # keep-aliveの接続がサーバー側で閉じられていた
+                self._http.close()
+                self._http = None
+                if attempt:
+                    raise
+            except Exception:
+                self._http.close()
+                self._http = None
+                raise
+    
+    def stop_webhook_worker(self):
+        """未送信のメッセージを送り終えてから送信スレッドを止める"""
+        self._outbox.append(None)
+        self._outbox_event.set()
+        self._webhook_thread.join(WEBHOOK_SHUTDOWN_TIMEOUT)
+    
+    def print_embeds(self, payload):
+        """送信できなかったEmbedの内容をコンソールに出力"""
+        for embed in payload["embeds"]:
+            print(f"\n{'='*50}")
+            print(embed["title"])
+            print(f"{'='*50}")
+            print(embed["description"].replace("**", ""))
+            for field in embed["fields"]:
+                print(f"\n{field['name']}:")
+                for line in field["value"].replace("**", "").split("\n"):
+                    print(f"  {line}")
+            print(f"{'='*50}\n")
     
     def format_unreachable_periods(self):
-        """到達不能時間を整形"""
-        if not self.unreachable_times:
+        """到達不能期間を「開始–終了 (秒数)」の形式で整形"""
+        if not self._outages:
             return "なし"
         
         periods = []
-        for unreachable_time in self.unreachable_times[:10]:  # 最初の10件
-            periods.append(unreachable_time.strftime("%H:%M:%S"))
+        for start, end in self._outages[:10]:  # 最初の10件
+            start_str = datetime.fromtimestamp(start).strftime("%H:%M:%S")
+            end_str = datetime.fromtimestamp(end).strftime("%H:%M:%S")
+            periods.append(f"{start_str}–{end_str} ({end - start + 1}s)")
         
         result = "\n".join(periods)
-        if len(self.unreachable_times) > 10:
-            result += f"\n... 他{len(self.unreachable_times) - 10}件"
+        if len(self._outages) > 10:
+            result += f"\n... 他{len(self._outages) - 10}件"
         
         return result
     
-    def print_daily_report(self, report_date):
+    def print_daily_report(self, report_date, stats=None):
         """コンソールに日次レポートを出力"""
+        if stats is None:
+            stats = self.summarize()
+        
         print(f"\n{'='*50}")
         print(f"📊 Ping Monitor 日次レポート - {report_date}")
         print(f"{'='*50}")
         print(f"対象: Google (8.8.8.8)")
         print(f"送信元: {self.local_ip}")
         
-        total_pings = len(self.ping_results) + len(self.unreachable_times)
-        success_rate = (len(self.ping_results) / total_pings * 100) if total_pings > 0 else 0
-        
-        if self.ping_results:
-            avg_time = mean(self.ping_results)
-            max_time = max(self.ping_results)
-            min_time = min(self.ping_results)
+        if stats.count:
             print(f"\n📊 応答時間統計:")
-            print(f"  平均: {avg_time:.1f}ms")
-            print(f"  最大: {max_time:.1f}ms")
-            print(f"  最小: {min_time:.1f}ms")
+            print(f"  平均: {stats.avg_time:.1f}ms")
+            print(f"  最大: {stats.max_time:.1f}ms")
+            print(f"  最小: {stats.min_time:.1f}ms")
+            print(f"  中央値: ≤{stats.p50_time:.1f}ms")
+            print(f"  99%: ≤{stats.p99_time:.1f}ms")
+            print(f"  標準偏差: {stats.std_time:.1f}ms")
         
         print(f"\n📈 到達性統計:")
-        print(f"  成功率: {success_rate:.2f}%")
-        print(f"  成功回数: {len(self.ping_results)}")
-        print(f"  失敗回数: {len(self.unreachable_times)}")
-        print(f"  総ping回数: {total_pings}")
+        print(f"  成功率: {stats.success_rate:.2f}%")
+        print(f"  成功回数: {stats.count}")
+        print(f"  失敗回数: {stats.fails}")
+        print(f"  総ping回数: {stats.total}")
+        
+        if stats.gw_count or stats.gw_fails:
+            print(f"\n🏠 ゲートウェイ(LAN)応答時間:")
+            print(f"  平均: {stats.gw_avg_time:.1f}ms")
+            print(f"  最大: {stats.gw_max_time:.1f}ms")
+            print(f"  99%: ≤{stats.gw_p99_time:.1f}ms")
+            print(f"  失敗回数: {stats.gw_fails}")
         
-        if self.unreachable_times:
-            print(f"\n⚠️ 到達不能時間:")
-            for unreachable_time in self.unreachable_times[:10]:
-                print(f"  {unreachable_time.strftime('%H:%M:%S')}")
-            if len(self.unreachable_times) > 10:
-                print(f"  ... 他{len(self.unreachable_times) - 10}件")
+        if self._outages:
+            print(f"\n⚠️ 到達不能期間:")
+            for line in self.format_unreachable_periods().split("\n"):
+                print(f"  {line}")
         
         print(f"{'='*50}\n")
     
-    def signal_handler(self, signum, frame):
+    def signal_handler(self, signum, frame=None):
         """シグナルハンドラー"""
+        self.flush_log()
         print(f"\n終了シグナル({signum})を受信しました。停止中...")
         self.running = False
-        self.stop_event.set()
+        # 待機中・ping中でもすぐに抜けるようにループをキャンセル
+        if self._ping_task is not None:
+            self._ping_task.cancel()
+    
+    def tune_scheduling(self):
+        """pingループのスレッドを1つのCPUに固定し、優先度を上げる（権限がなければそのまま）"""
+        if hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+            except OSError:
+                pass
+        if hasattr(os, 'nice'):
+            try:
+                os.nice(-5)
+            except PermissionError:
+                pass
+        if self.realtime:
+            try:
+                os.sched_setscheduler(0, os.SCHED_RR, os.sched_param(1))
+            except (AttributeError, PermissionError) as e:
+                print(f"リアルタイムスケジューリングを設定できません: {e}")
+    
+    async def main_async(self):
+        """イベントループ上でモニタリングを実行"""
+        loop = asyncio.get_running_loop()
         
-        # 現在の日の統計があれば送信
-        if self.ping_results or self.unreachable_times:
-            print("現在の統計を送信中...")
-            self.send_daily_report(datetime.now().date())
+        # シグナルハンドラーの設定
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.signal_handler, signum)
+            except NotImplementedError:
+                # Windowsではadd_signal_handlerが使えない
+                signal.signal(signum, lambda signum, frame: loop.call_soon_threadsafe(self.signal_handler, signum))
         
-        sys.exit(0)
+        if self._icmp_sock is not None:
+            loop.add_reader(self._icmp_sock, self.on_icmp_readable)
+        # 送信スレッドは起動済みなので、固定・優先度変更はこのスレッドだけにかかる
+        self.tune_scheduling()
+        # ループ中はほとんど割り当てがないため、GCによる停止を避ける
+        gc.disable()
+        self._ping_task = asyncio.ensure_future(self.ping_loop())
+        try:
+            await self._ping_task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.flush_log()
+            gc.enable()
+            if self._icmp_sock is not None:
+                loop.remove_reader(self._icmp_sock)
     
     def run(self):
         """メイン実行関数"""
         try:
-            self.ping_loop()
+            asyncio.run(self.main_async())
         except KeyboardInterrupt:
-            self.signal_handler(signal.SIGINT, None)
+            print(f"\n終了シグナル({signal.SIGINT})を受信しました。停止中...")
         except Exception as e:
             print(f"予期しないエラー: {e}")
             sys.exit(1)
+        
+        # 現在の日の統計があれば送信
+        if self._google.count or self._n_unreachable:
+            print("現在の統計を送信中...")
+            self.send_daily_report(date.today())
+        self.stop_webhook_worker()
 
 def main():
     """メイン関数"""
+    parser = argparse.ArgumentParser(description="Google Ping Monitor")
+    parser.add_argument("--rt", action="store_true",
+                        help="pingループをリアルタイム優先度(SCHED_RR)で実行する（要root/CAP_SYS_NICE）")
+    args = parser.parse_args()
+    
     print("🌐 Google Ping Monitor")
     print("=" * 30)
     
@@ -338,7 +908,7 @@ def main():
         return
     
     # モニター開始
-    monitor = PingMonitor(config_path)
+    monitor = PingMonitor(config_path, realtime=args.rt)
     monitor.run()
 
 if __name__ == "__main__":